@@ -0,0 +1,157 @@
+"""
+Shared Steam environment
+Resolves Steam installation, library folders, appmanifest data and game names
+once per process, so both monitor versions share the same caches.
+"""
+
+import os
+import threading
+import winreg
+from typing import Optional, List, Tuple
+
+
+def _extract_vdf_field(buf: bytes, key: bytes) -> List[bytes]:
+    """
+    Extract values of all `"key" "value"` pairs for the given quoted key
+    from VDF/ACF content with a linear scan.
+    """
+    values = []
+    i = buf.find(key)
+    while i != -1:
+        i += len(key)
+        start = buf.find(b'"', i) + 1
+        end = buf.find(b'"', start) if start else -1
+        if end == -1:
+            break
+        # Only accept a non-empty value separated from the key by whitespace
+        if end > start and start - 1 > i and not buf[i:start - 1].strip():
+            values.append(buf[start:end])
+            i = end + 1
+        i = buf.find(key, i)
+    return values
+
+
+class SteamEnv:
+    """Process-wide singleton holding Steam path and parsed Steam files."""
+    
+    _instance = None
+    _instance_lock = threading.Lock()
+    
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance.steam_path = instance._find_steam_path()
+                instance._name_cache = {}
+                instance._library_folders_cache = None  # (mtime, folders)
+                instance._manifest_cache = {}  # manifest_path -> (mtime, state_flags, name)
+                cls._instance = instance
+        return cls._instance
+    
+    def _find_steam_path(self) -> Optional[str]:
+        """
+        Find Steam installation path from Windows Registry.
+        Checks both 32-bit and 64-bit registry keys.
+        """
+        # HKCU is authoritative for per-user Steam installs, check it alone first
+        try:
+            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Software\Valve\Steam") as key:
+                steam_path, _ = winreg.QueryValueEx(key, "SteamPath")
+                if steam_path and os.path.exists(steam_path):
+                    return steam_path
+        except (FileNotFoundError, OSError):
+            pass
+        
+        # Fall back to machine-wide keys
+        registry_paths = [
+            r"SOFTWARE\WOW6432Node\Valve\Steam",
+            r"SOFTWARE\Valve\Steam",
+        ]
+        
+        for subkey in registry_paths:
+            try:
+                with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, subkey) as key:
+                    steam_path, _ = winreg.QueryValueEx(key, "SteamPath")
+                    if steam_path and os.path.exists(steam_path):
+                        return steam_path
+            except (FileNotFoundError, OSError):
+                continue
+        return None
+    
+    def resolve_library_folders(self) -> List[str]:
+        """
+        Get steamapps folders of all Steam libraries.
+        Result is cached until libraryfolders.vdf changes.
+        """
+        library_vdf = os.path.join(self.steam_path, 'steamapps', 'libraryfolders.vdf')
+        try:
+            mtime = os.stat(library_vdf).st_mtime
+        except OSError:
+            mtime = 0
+        
+        if self._library_folders_cache is not None and self._library_folders_cache[0] == mtime:
+            return self._library_folders_cache[1]
+        
+        library_folders = [os.path.join(self.steam_path, 'steamapps')]
+        # libraryfolders.vdf lists the main Steam folder too, skip duplicates
+        seen = {os.path.normcase(os.path.normpath(library_folders[0]))}
+        if mtime:
+            try:
+                with open(library_vdf, 'rb') as f:
+                    content = f.read()
+                    paths = _extract_vdf_field(content, b'"path"')
+                    for raw_path in paths:
+                        path = raw_path.decode('utf-8', 'replace')
+                        lib_path = os.path.join(path.replace('\\\\', '\\'), 'steamapps')
+                        folder_key = os.path.normcase(os.path.normpath(lib_path))
+                        if folder_key not in seen and os.path.exists(lib_path):
+                            seen.add(folder_key)
+                            library_folders.append(lib_path)
+            except Exception:
+                pass
+        
+        self._library_folders_cache = (mtime, library_folders)
+        return library_folders
+    
+    def read_manifest(self, manifest_path: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Get (StateFlags, name) from an appmanifest file.
+        Parsed values are cached until the file's mtime changes.
+        """
+        mtime = os.stat(manifest_path).st_mtime
+        cached = self._manifest_cache.get(manifest_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+        
+        with open(manifest_path, 'rb') as f:
+            content = f.read()
+        state_values = [v for v in _extract_vdf_field(content, b'"StateFlags"') if v.isdigit()]
+        name_values = _extract_vdf_field(content, b'"name"')
+        state_flags = state_values[0].decode('ascii') if state_values else None
+        name = name_values[0].decode('utf-8', 'replace') if name_values else None
+        
+        self._manifest_cache[manifest_path] = (mtime, state_flags, name)
+        return state_flags, name
+    
+    def get_app_name(self, app_id: str) -> str:
+        """
+        Try to get game name from Steam appmanifest files.
+        """
+        if app_id in self._name_cache:
+            return self._name_cache[app_id]
+        
+        if not self.steam_path:
+            return f"AppID {app_id}"
+        
+        for folder in self.resolve_library_folders():
+            manifest_file = os.path.join(folder, f'appmanifest_{app_id}.acf')
+            if os.path.exists(manifest_file):
+                try:
+                    _, name = self.read_manifest(manifest_file)
+                    if name:
+                        self._name_cache[app_id] = name
+                        return name
+                except Exception:
+                    pass
+        
+        return f"AppID {app_id}"
@@ -6,86 +6,57 @@ Works independently of Steam installation location.
 
 import os
 import re
+import sys
+import json
 import time
-import winreg
+import ctypes
+import tempfile
+import threading
 from pathlib import Path
 from datetime import datetime
 from typing import Optional, Tuple
 
+from _steam_env import SteamEnv
+
+
+# Precompiled patterns for log parsing
+_SPEED_RE = re.compile(r'AppID (\d+).*?(\d+\.?\d*)\s*MB/s')
+_APPID_RE = re.compile(r'AppID (\d+)')
+_PAUSED_RE = re.compile(r'paused|suspended', re.IGNORECASE)
+
+# Only the most recent content_log.txt entry matters, so never read further back than this
+_MAX_LOOKBACK = 8 * 1024
+
+# Win32 change notification constants for watching the logs folder
+_FILE_NOTIFY_CHANGE_SIZE = 0x00000008
+_FILE_NOTIFY_CHANGE_LAST_WRITE = 0x00000010
+_WAIT_OBJECT_0 = 0x00000000
+_INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
+
+# Longest single blocking wait; Event and Win32 waits are not interrupted by
+# Ctrl+C on Windows, so slice them to notice KeyboardInterrupt and stop() promptly
+_STOP_CHECK_INTERVAL = 1.0
+
 
 class SteamDownloadMonitor:
     def __init__(self):
-        self.steam_path = self._find_steam_path()
+        self.env = SteamEnv()
+        self.steam_path = self.env.steam_path
         self.log_path = None
         if self.steam_path:
+            print(f"✓ Steam найден: {self.steam_path}")
             self.log_path = os.path.join(self.steam_path, 'logs', 'content_log.txt')
-        self.last_position = 0
-        
-    def _find_steam_path(self) -> Optional[str]:
-        """
-        Find Steam installation path from Windows Registry.
-        Checks both 32-bit and 64-bit registry keys.
-        """
-        registry_paths = [
-            (winreg.HKEY_CURRENT_USER, r"Software\Valve\Steam"),
-            (winreg.HKEY_LOCAL_MACHINE, r"SOFTWARE\WOW6432Node\Valve\Steam"),
-            (winreg.HKEY_LOCAL_MACHINE, r"SOFTWARE\Valve\Steam"),
-        ]
-        
-        for hkey, subkey in registry_paths:
-            try:
-                with winreg.OpenKey(hkey, subkey) as key:
-                    steam_path, _ = winreg.QueryValueEx(key, "SteamPath")
-                    if steam_path and os.path.exists(steam_path):
-                        print(f"✓ Steam найден: {steam_path}")
-                        return steam_path
-            except (FileNotFoundError, OSError):
-                continue
-        
-        print("✗ Steam не найден в реестре")
-        return None
-    
-    def _get_app_name(self, app_id: str) -> str:
-        """
-        Try to get game name from Steam appmanifest files.
-        """
-        if not self.steam_path:
-            return f"AppID {app_id}"
-        
-        # Check common library folders
-        library_folders = [
-            os.path.join(self.steam_path, 'steamapps'),
-        ]
-        
-        # Try to read libraryfolders.vdf for additional library locations
-        library_vdf = os.path.join(self.steam_path, 'steamapps', 'libraryfolders.vdf')
-        if os.path.exists(library_vdf):
-            try:
-                with open(library_vdf, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    paths = re.findall(r'"path"\s+"([^"]+)"', content)
-                    for path in paths:
-                        lib_path = os.path.join(path.replace('\\\\', '\\'), 'steamapps')
-                        if os.path.exists(lib_path):
-                            library_folders.append(lib_path)
-            except Exception:
-                pass
-        
-        # Search for appmanifest file
-        for folder in library_folders:
-            manifest_file = os.path.join(folder, f'appmanifest_{app_id}.acf')
-            if os.path.exists(manifest_file):
-                try:
-                    with open(manifest_file, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        match = re.search(r'"name"\s+"([^"]+)"', content)
-                        if match:
-                            return match.group(1)
-                except Exception:
-                    pass
-        
-        return f"AppID {app_id}"
-    
+        else:
+            print("✗ Steam не найден в реестре")
+        self._state_file = os.path.join(tempfile.gettempdir(), 'steam_monitor_pos.json')
+        self.last_position = self._load_last_position()
+        self._saved_position = self.last_position
+        self._last_log_mtime = 0
+        self._last_log_size = 0
+        self._latest_entry = None
+        self._log_watch_handle = None
+        self._stop = threading.Event()
+        
     def _parse_log_line(self, line: str) -> Optional[Tuple[str, float, str]]:
         """
         Parse Steam log line to extract download information.
@@ -93,70 +64,171 @@ class SteamDownloadMonitor:
         """
         # Pattern for download progress with speed
         # Example: [2024-01-28 10:30:45] AppID 1234567 update, downloaded 1024.5 MB at 50.2 MB/s
-        speed_pattern = r'AppID (\d+).*?(\d+\.?\d*)\s*MB/s'
-        match = re.search(speed_pattern, line)
+        match = _SPEED_RE.search(line)
+        is_paused = _PAUSED_RE.search(line) is not None
         
         if match:
             app_id = match.group(1)
             speed = float(match.group(2))
-            status = "downloading"
-            
-            # Check if paused
-            if 'paused' in line.lower() or 'suspended' in line.lower():
-                status = "paused"
-            
+            status = "paused" if is_paused else "downloading"
             return (app_id, speed, status)
         
         # Check for paused state
-        if 'paused' in line.lower() or 'suspended' in line.lower():
-            app_match = re.search(r'AppID (\d+)', line)
+        if is_paused:
+            app_match = _APPID_RE.search(line)
             if app_match:
                 return (app_match.group(1), 0.0, "paused")
         
         return None
     
-    def _read_new_log_entries(self) -> list:
+    def _load_last_position(self) -> int:
         """
-        Read new entries from Steam log file since last read.
+        Restore log read position saved by a previous run.
+        Without saved state, start from 0; the _MAX_LOOKBACK window bounds the first read.
         """
         if not self.log_path or not os.path.exists(self.log_path):
-            return []
+            return 0
         
-        new_entries = []
+        size = os.path.getsize(self.log_path)
         try:
-            with open(self.log_path, 'r', encoding='utf-8', errors='ignore') as f:
-                f.seek(self.last_position)
-                new_entries = f.readlines()
-                self.last_position = f.tell()
+            with open(self._state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('path') == self.log_path:
+                pos = int(state.get('pos', 0))
+                # Log was truncated or rotated since last run
+                return pos if pos <= size else 0
+        except (OSError, ValueError, TypeError, AttributeError):
+            pass
+        
+        return 0
+    
+    def _save_last_position(self):
+        """Persist log read position so a restart does not rescan the log."""
+        if self.last_position == self._saved_position:
+            return
+        
+        try:
+            with open(self._state_file, 'w', encoding='utf-8') as f:
+                json.dump({'path': self.log_path, 'pos': self.last_position}, f)
+            self._saved_position = self.last_position
+        except OSError:
+            pass
+    
+    def _scan_tail_for_status(self) -> Optional[Tuple[str, float, str]]:
+        """
+        Read new log bytes since last read (at most the last _MAX_LOOKBACK bytes)
+        and return the most recent parsed download entry.
+        """
+        if not self.log_path or not os.path.exists(self.log_path):
+            return None
+        
+        parsed = None
+        try:
+            st = os.stat(self.log_path)
+            if st.st_mtime == self._last_log_mtime and st.st_size == self._last_log_size:
+                # Log untouched since last read
+                return None
+            
+            size = st.st_size
+            if size < self.last_position:
+                # Log was truncated or rotated, start over
+                self.last_position = 0
+            
+            start = max(self.last_position, size - _MAX_LOOKBACK)
+            with open(self.log_path, 'rb') as f:
+                f.seek(start)
+                lines = f.read(size - start).split(b'\n')
+            if start > self.last_position:
+                # Window starts mid-line, drop the partial first line
+                lines.pop(0)
+            for raw_line in reversed(lines):  # Start from most recent
+                parsed = self._parse_log_line(raw_line.decode('utf-8', 'ignore'))
+                if parsed:
+                    break
+            self.last_position = size
+            self._last_log_mtime = st.st_mtime
+            self._last_log_size = size
         except Exception as e:
             print(f"Ошибка чтения лога: {e}")
         
-        return new_entries
+        return parsed
+    
+    def _drain_log(self):
+        """
+        Read new log entries and remember the most recent download entry
+        until the next status query.
+        """
+        parsed = self._scan_tail_for_status()
+        if parsed:
+            self._latest_entry = parsed
+    
+    def _open_log_watch(self):
+        """
+        Start watching the logs folder for writes via Win32 change notifications.
+        Leaves the handle unset if notifications are unavailable.
+        """
+        self._close_log_watch()
+        logs_dir = os.path.dirname(self.log_path)
+        try:
+            kernel32 = ctypes.windll.kernel32
+            kernel32.FindFirstChangeNotificationW.restype = ctypes.c_void_p
+            handle = kernel32.FindFirstChangeNotificationW(
+                logs_dir, False, _FILE_NOTIFY_CHANGE_LAST_WRITE | _FILE_NOTIFY_CHANGE_SIZE
+            )
+        except (AttributeError, OSError):
+            return
+        
+        if handle and handle != _INVALID_HANDLE_VALUE:
+            self._log_watch_handle = handle
+    
+    def _close_log_watch(self):
+        """Stop watching the logs folder."""
+        if self._log_watch_handle is not None:
+            ctypes.windll.kernel32.FindCloseChangeNotification(ctypes.c_void_p(self._log_watch_handle))
+            self._log_watch_handle = None
+    
+    def _wait_for_log_change(self, timeout: float) -> bool:
+        """
+        Block until the logs folder is written to or timeout expires
+        (at most _STOP_CHECK_INTERVAL per call).
+        Falls back to sleeping when change notifications are unavailable.
+        Returns True if the logs folder changed.
+        """
+        timeout = min(timeout, _STOP_CHECK_INTERVAL)
+        if self._log_watch_handle is None:
+            self._stop.wait(timeout)
+            return False
+        
+        handle = ctypes.c_void_p(self._log_watch_handle)
+        kernel32 = ctypes.windll.kernel32
+        if kernel32.WaitForSingleObject(handle, int(timeout * 1000)) == _WAIT_OBJECT_0:
+            kernel32.FindNextChangeNotification(handle)
+            return True
+        return False
     
     def get_current_download_status(self) -> Optional[dict]:
         """
         Get current download status by reading Steam logs.
         Returns dict with app_id, game_name, speed, and status.
         """
-        entries = self._read_new_log_entries()
-        
-        # Process entries to find the most recent download info
-        latest_info = None
-        for line in reversed(entries):  # Start from most recent
-            parsed = self._parse_log_line(line)
-            if parsed:
-                app_id, speed, status = parsed
-                game_name = self._get_app_name(app_id)
-                latest_info = {
-                    'app_id': app_id,
-                    'game_name': game_name,
-                    'speed_mbps': speed,
-                    'status': status,
-                    'timestamp': datetime.now()
-                }
-                break
-        
-        return latest_info
+        self._drain_log()
+        self._save_last_position()
+        parsed, self._latest_entry = self._latest_entry, None
+        if not parsed:
+            return None
+        
+        app_id, speed, status = parsed
+        return {
+            'app_id': app_id,
+            'game_name': self.env.get_app_name(app_id),
+            'speed_mbps': speed,
+            'status': status,
+            'timestamp': datetime.now()
+        }
+    
+    def stop(self):
+        """Stop a running monitor() loop, e.g. from another thread."""
+        self._stop.set()
     
     def monitor(self, duration_minutes: int = 5, interval_seconds: int = 60):
         """
@@ -189,48 +261,55 @@ class SteamDownloadMonitor:
         check_count = 0
         last_status = None
         
-        while time.time() < end_time:
-            check_count += 1
-            current_time = datetime.now().strftime("%H:%M:%S")
-            
-            print(f"\n[{current_time}] Проверка #{check_count}")
-            print("-" * 70)
-            
-            status = self.get_current_download_status()
-            
-            if status:
-                game_name = status['game_name']
-                speed = status['speed_mbps']
-                download_status = status['status']
+        self._stop.clear()
+        self._open_log_watch()
+        try:
+            while time.time() < end_time and not self._stop.is_set():
+                check_count += 1
+                current_time = datetime.now().strftime("%H:%M:%S")
+                out = []
+                
+                out.append(f"\n[{current_time}] Проверка #{check_count}\n")
+                out.append("-" * 70 + "\n")
                 
-                if download_status == "downloading":
-                    print(f"📥 Игра: {game_name}")
-                    print(f"📊 Скорость: {speed:.2f} MB/s ({speed * 8:.2f} Mbps)")
-                    print(f"✓ Статус: Загрузка")
-                elif download_status == "paused":
-                    print(f"⏸️  Игра: {game_name}")
-                    print(f"📊 Скорость: 0.00 MB/s")
-                    print(f"⏸  Статус: Пауза")
+                status = self.get_current_download_status()
                 
-                last_status = status
-            else:
-                if last_status:
-                    print(f"ℹ️  Последняя загрузка: {last_status['game_name']}")
-                    print(f"📊 Нет активных загрузок")
+                if status:
+                    game_name = status['game_name']
+                    speed = status['speed_mbps']
+                    download_status = status['status']
+                    
+                    if download_status == "downloading":
+                        out.append(f"📥 Игра: {game_name}\n")
+                        out.append(f"📊 Скорость: {speed:.2f} MB/s ({speed * 8:.2f} Mbps)\n")
+                        out.append(f"✓ Статус: Загрузка\n")
+                    elif download_status == "paused":
+                        out.append(f"⏸️  Игра: {game_name}\n")
+                        out.append(f"📊 Скорость: 0.00 MB/s\n")
+                        out.append(f"⏸  Статус: Пауза\n")
+                    
+                    last_status = status
                 else:
-                    print("📊 Нет активных загрузок")
-                    print("ℹ️  Запустите загрузку игры в Steam для начала мониторинга")
-            
-            print("-" * 70)
-            
-            # Wait for next check
-            remaining_time = end_time - time.time()
-            if remaining_time > interval_seconds:
-                time.sleep(interval_seconds)
-            elif remaining_time > 0:
-                time.sleep(remaining_time)
-            else:
-                break
+                    if last_status:
+                        out.append(f"ℹ️  Последняя загрузка: {last_status['game_name']}\n")
+                        out.append(f"📊 Нет активных загрузок\n")
+                    else:
+                        out.append("📊 Нет активных загрузок\n")
+                        out.append("ℹ️  Запустите загрузку игры в Steam для начала мониторинга\n")
+                
+                out.append("-" * 70 + "\n")
+                sys.stdout.write("".join(out))
+                sys.stdout.flush()
+                
+                # Wait for next scheduled check, draining the log whenever Steam writes to it
+                next_check = min(start_time + check_count * interval_seconds, end_time)
+                remaining_time = next_check - time.time()
+                while remaining_time > 0 and not self._stop.is_set():
+                    if self._wait_for_log_change(remaining_time):
+                        self._drain_log()
+                    remaining_time = next_check - time.time()
+        finally:
+            self._close_log_watch()
         
         print("\n" + "="*70)
         print("МОНИТОРИНГ ЗАВЕРШЕН")
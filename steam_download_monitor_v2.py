@@ -5,73 +5,33 @@ This method is more reliable as it reads Steam's internal state files.
 """
 
 import os
-import re
+import sys
+import glob
 import time
-import winreg
+import threading
 import struct
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
+
+from _steam_env import SteamEnv
+
+
+# Longest single blocking wait; Event waits are not interrupted by Ctrl+C
+# on Windows, so slice them to notice KeyboardInterrupt and stop() promptly
+_STOP_CHECK_INTERVAL = 1.0
 
 
 class SteamDownloadMonitorV2:
     def __init__(self):
-        self.steam_path = self._find_steam_path()
-        self.download_stats = []
+        self.env = SteamEnv()
+        self.steam_path = self.env.steam_path
+        self.download_stats = {}
+        self._pool = None
+        self._pool_size = 0
+        self._stop = threading.Event()
         
-    def _find_steam_path(self) -> Optional[str]:
-        """Find Steam installation path from Windows Registry."""
-        registry_paths = [
-            (winreg.HKEY_CURRENT_USER, r"Software\Valve\Steam"),
-            (winreg.HKEY_LOCAL_MACHINE, r"SOFTWARE\WOW6432Node\Valve\Steam"),
-            (winreg.HKEY_LOCAL_MACHINE, r"SOFTWARE\Valve\Steam"),
-        ]
-        
-        for hkey, subkey in registry_paths:
-            try:
-                with winreg.OpenKey(hkey, subkey) as key:
-                    steam_path, _ = winreg.QueryValueEx(key, "SteamPath")
-                    if steam_path and os.path.exists(steam_path):
-                        return steam_path
-            except (FileNotFoundError, OSError):
-                continue
-        return None
-    
-    def _get_app_name(self, app_id: str) -> str:
-        """Get game name from appmanifest files."""
-        if not self.steam_path:
-            return f"AppID {app_id}"
-        
-        library_folders = [os.path.join(self.steam_path, 'steamapps')]
-        
-        # Read libraryfolders.vdf
-        library_vdf = os.path.join(self.steam_path, 'steamapps', 'libraryfolders.vdf')
-        if os.path.exists(library_vdf):
-            try:
-                with open(library_vdf, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    paths = re.findall(r'"path"\s+"([^"]+)"', content)
-                    for path in paths:
-                        lib_path = os.path.join(path.replace('\\\\', '\\'), 'steamapps')
-                        if os.path.exists(lib_path):
-                            library_folders.append(lib_path)
-            except Exception:
-                pass
-        
-        for folder in library_folders:
-            manifest_file = os.path.join(folder, f'appmanifest_{app_id}.acf')
-            if os.path.exists(manifest_file):
-                try:
-                    with open(manifest_file, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        match = re.search(r'"name"\s+"([^"]+)"', content)
-                        if match:
-                            return match.group(1)
-                except Exception:
-                    pass
-        
-        return f"AppID {app_id}"
-    
     def _read_steam_process_stats(self) -> Optional[Dict]:
         """
         Read download statistics from Steam process memory or status files.
@@ -87,126 +47,120 @@ class SteamDownloadMonitorV2:
         # For now, return mock data structure
         return None
     
-    def _get_downloading_apps(self) -> List[str]:
+    def _map_folders(self, func, folders: List[str]) -> List:
         """
-        Get list of currently downloading apps by checking .downloading files.
+        Apply func to every library folder, in parallel across folders
+        since they usually live on independent drives.
         """
-        if not self.steam_path:
-            return []
+        if len(folders) <= 1:
+            return [func(folder) for folder in folders]
         
+        workers = min(8, len(folders))
+        if self._pool is None or self._pool_size < workers:
+            # Library folders were added since the pool was created
+            self.close()
+            self._pool = ThreadPoolExecutor(max_workers=workers)
+            self._pool_size = workers
+        return list(self._pool.map(func, folders))
+    
+    def close(self):
+        """Shut down the folder scanning thread pool."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+            self._pool_size = 0
+    
+    def _get_folder_downloading_apps(self, folder: str) -> List[str]:
+        """
+        Get list of currently downloading apps in one steamapps folder.
+        """
         downloading_apps = []
-        steamapps_folders = [os.path.join(self.steam_path, 'steamapps')]
-        
-        # Check for library folders
-        library_vdf = os.path.join(self.steam_path, 'steamapps', 'libraryfolders.vdf')
-        if os.path.exists(library_vdf):
+        pattern = os.path.join(glob.escape(folder), 'appmanifest_*.acf')
+        dl_base = f"{folder}{os.sep}downloading{os.sep}"
+        for manifest_path in glob.iglob(pattern):
+            app_id = os.path.basename(manifest_path)[len('appmanifest_'):-len('.acf')]
+            
+            # Check if downloading folder exists
+            downloading_folder = dl_base + app_id
+            if os.path.exists(downloading_folder):
+                downloading_apps.append(app_id)
+            
+            # Check manifest for download state
             try:
-                with open(library_vdf, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    paths = re.findall(r'"path"\s+"([^"]+)"', content)
-                    for path in paths:
-                        lib_path = os.path.join(path.replace('\\\\', '\\'), 'steamapps')
-                        if os.path.exists(lib_path):
-                            steamapps_folders.append(lib_path)
+                state_flags, _ = self.env.read_manifest(manifest_path)
+                # StateFlags "4" usually means downloading
+                if state_flags in ['2', '4', '6']:
+                    if app_id not in downloading_apps:
+                        downloading_apps.append(app_id)
             except Exception:
                 pass
         
-        # Look for downloading indicators
-        for folder in steamapps_folders:
-            if not os.path.exists(folder):
+        return downloading_apps
+    
+    def _scan_downloading(self, path: str) -> Tuple[int, float]:
+        """
+        Walk downloading folder once with a single stat per entry.
+        Returns (total_size, latest_mtime) of files under path.
+        """
+        total_size = 0
+        latest_mtime = 0.0
+        stack = [path]
+        while stack:
+            # Steam creates and removes chunk files while downloading,
+            # skip entries that vanish mid-walk
+            try:
+                it = os.scandir(stack.pop())
+            except FileNotFoundError:
                 continue
-            
-            # Check for .downloading files or temp files
-            for file in os.listdir(folder):
-                if file.startswith('appmanifest_') and file.endswith('.acf'):
-                    app_id = file.replace('appmanifest_', '').replace('.acf', '')
-                    manifest_path = os.path.join(folder, file)
-                    
-                    # Check if downloading folder exists
-                    downloading_folder = os.path.join(folder, 'downloading', app_id)
-                    if os.path.exists(downloading_folder):
-                        downloading_apps.append(app_id)
-                    
-                    # Check manifest for download state
+            with it:
+                for entry in it:
                     try:
-                        with open(manifest_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            if 'StateFlags' in content:
-                                # StateFlags "4" usually means downloading
-                                state_match = re.search(r'"StateFlags"\s+"(\d+)"', content)
-                                if state_match and state_match.group(1) in ['2', '4', '6']:
-                                    if app_id not in downloading_apps:
-                                        downloading_apps.append(app_id)
-                    except Exception:
-                        pass
-        
-        return downloading_apps
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                            continue
+                        st = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+                    total_size += st.st_size
+                    latest_mtime = max(latest_mtime, st.st_mtime)
+        return total_size, latest_mtime
     
-    def _estimate_download_speed(self, app_id: str, folder: str) -> float:
+    def _estimate_download_speed(self, app_id: str, total_size: int) -> float:
         """
-        Estimate download speed by monitoring file size changes.
+        Estimate download speed from the change of total size since last check.
         Returns speed in MB/s.
         """
-        downloading_folder = os.path.join(folder, 'downloading', app_id)
-        if not os.path.exists(downloading_folder):
-            return 0.0
+        # Store current size for speed calculation
+        current_time = time.time()
+        if app_id in self.download_stats:
+            last_size, last_time = self.download_stats[app_id]
+            time_diff = current_time - last_time
+            if time_diff > 0:
+                size_diff = total_size - last_size
+                speed_bytes_per_sec = size_diff / time_diff
+                speed_mb_per_sec = speed_bytes_per_sec / (1024 * 1024)
+                self.download_stats[app_id] = (total_size, current_time)
+                return max(0, speed_mb_per_sec)
         
-        try:
-            # Get total size of files in downloading folder
-            total_size = 0
-            for root, dirs, files in os.walk(downloading_folder):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    if os.path.exists(file_path):
-                        total_size += os.path.getsize(file_path)
-            
-            # Store current size for speed calculation
-            current_time = time.time()
-            if app_id in self.download_stats:
-                last_size, last_time = self.download_stats[app_id]
-                time_diff = current_time - last_time
-                if time_diff > 0:
-                    size_diff = total_size - last_size
-                    speed_bytes_per_sec = size_diff / time_diff
-                    speed_mb_per_sec = speed_bytes_per_sec / (1024 * 1024)
-                    self.download_stats[app_id] = (total_size, current_time)
-                    return max(0, speed_mb_per_sec)
-            
-            self.download_stats[app_id] = (total_size, current_time)
-            return 0.0
-            
-        except Exception:
-            return 0.0
+        self.download_stats[app_id] = (total_size, current_time)
+        return 0.0
     
-    def get_download_info(self) -> List[Dict]:
-        """Get information about all current downloads."""
-        if not self.steam_path:
-            return []
-        
+    def _scan_folder(self, folder: str, app_ids: List[str]) -> List[Dict]:
+        """Get information about the given current downloads in one steamapps folder."""
         downloads = []
-        downloading_apps = self._get_downloading_apps()
+        dl_base = f"{folder}{os.sep}downloading{os.sep}"
         
-        for app_id in downloading_apps:
-            game_name = self._get_app_name(app_id)
-            
-            # Try to find the library folder for this app
-            steamapps_folder = os.path.join(self.steam_path, 'steamapps')
-            speed = self._estimate_download_speed(app_id, steamapps_folder)
+        for app_id in app_ids:
+            game_name = self.env.get_app_name(app_id)
+            downloading_folder = dl_base + app_id
             
-            # Check if paused by looking at recent file modifications
-            downloading_folder = os.path.join(steamapps_folder, 'downloading', app_id)
+            # Size gives the speed, recent file modifications tell if paused
+            speed = 0.0
             is_active = False
             if os.path.exists(downloading_folder):
-                # Check if any files were modified in the last 2 minutes
                 try:
-                    latest_mtime = 0
-                    for root, dirs, files in os.walk(downloading_folder):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            if os.path.exists(file_path):
-                                mtime = os.path.getmtime(file_path)
-                                latest_mtime = max(latest_mtime, mtime)
-                    
+                    total_size, latest_mtime = self._scan_downloading(downloading_folder)
+                    speed = self._estimate_download_speed(app_id, total_size)
                     if time.time() - latest_mtime < 120:  # Modified in last 2 minutes
                         is_active = True
                 except Exception:
@@ -223,6 +177,39 @@ class SteamDownloadMonitorV2:
         
         return downloads
     
+    def get_download_info(self) -> List[Dict]:
+        """Get information about all current downloads."""
+        if not self.steam_path:
+            return []
+        
+        steamapps_folders = self.env.resolve_library_folders()
+        folder_apps = self._map_folders(self._get_folder_downloading_apps, steamapps_folders)
+        
+        # A stale appmanifest is often left in another library after moving a game,
+        # keep each app once, preferring the library it is actually downloading into
+        app_folders = {}
+        for folder, app_ids in zip(steamapps_folders, folder_apps):
+            for app_id in app_ids:
+                current = app_folders.get(app_id)
+                if current is None or (
+                    not os.path.exists(f"{current}{os.sep}downloading{os.sep}{app_id}")
+                    and os.path.exists(f"{folder}{os.sep}downloading{os.sep}{app_id}")
+                ):
+                    app_folders[app_id] = folder
+        
+        assigned = {folder: [] for folder in steamapps_folders}
+        for app_id, folder in app_folders.items():
+            assigned[folder].append(app_id)
+        
+        folder_downloads = self._map_folders(
+            lambda folder: self._scan_folder(folder, assigned[folder]), steamapps_folders
+        )
+        return [dl for downloads in folder_downloads for dl in downloads]
+    
+    def stop(self):
+        """Stop a running monitor() loop, e.g. from another thread."""
+        self._stop.set()
+    
     def monitor(self, duration_minutes: int = 5, interval_seconds: int = 60):
         """Monitor Steam downloads for specified duration."""
         if not self.steam_path:
@@ -242,43 +229,49 @@ class SteamDownloadMonitorV2:
         end_time = start_time + (duration_minutes * 60)
         check_count = 0
         
-        while time.time() < end_time:
-            check_count += 1
-            current_time = datetime.now().strftime("%H:%M:%S")
-            
-            print(f"\n[{current_time}] Проверка #{check_count}")
-            print("-" * 70)
-            
-            downloads = self.get_download_info()
-            
-            if downloads:
-                for dl in downloads:
-                    game_name = dl['game_name']
-                    speed = dl['speed_mbps']
-                    status = dl['status']
-                    
-                    if status == "downloading":
-                        print(f"📥 Игра: {game_name}")
-                        print(f"📊 Скорость: {speed:.2f} MB/s ({speed * 8:.2f} Mbps)")
-                        print(f"✓ Статус: Загрузка")
-                    else:
-                        print(f"⏸️  Игра: {game_name}")
-                        print(f"📊 Скорость: 0.00 MB/s")
-                        print(f"⏸  Статус: Пауза")
-                    print()
-            else:
-                print("📊 Нет активных загрузок")
-                print("ℹ️  Запустите загрузку игры в Steam для начала мониторинга")
-            
-            print("-" * 70)
-            
-            remaining_time = end_time - time.time()
-            if remaining_time > interval_seconds:
-                time.sleep(interval_seconds)
-            elif remaining_time > 0:
-                time.sleep(remaining_time)
-            else:
-                break
+        self._stop.clear()
+        try:
+            while time.time() < end_time and not self._stop.is_set():
+                check_count += 1
+                current_time = datetime.now().strftime("%H:%M:%S")
+                out = []
+                
+                out.append(f"\n[{current_time}] Проверка #{check_count}\n")
+                out.append("-" * 70 + "\n")
+                
+                downloads = self.get_download_info()
+                
+                if downloads:
+                    for dl in downloads:
+                        game_name = dl['game_name']
+                        speed = dl['speed_mbps']
+                        status = dl['status']
+                        
+                        if status == "downloading":
+                            out.append(f"📥 Игра: {game_name}\n")
+                            out.append(f"📊 Скорость: {speed:.2f} MB/s ({speed * 8:.2f} Mbps)\n")
+                            out.append(f"✓ Статус: Загрузка\n")
+                        else:
+                            out.append(f"⏸️  Игра: {game_name}\n")
+                            out.append(f"📊 Скорость: 0.00 MB/s\n")
+                            out.append(f"⏸  Статус: Пауза\n")
+                        out.append("\n")
+                else:
+                    out.append("📊 Нет активных загрузок\n")
+                    out.append("ℹ️  Запустите загрузку игры в Steam для начала мониторинга\n")
+                
+                out.append("-" * 70 + "\n")
+                sys.stdout.write("".join(out))
+                sys.stdout.flush()
+                
+                # Wait for next scheduled check
+                next_check = min(start_time + check_count * interval_seconds, end_time)
+                remaining_time = next_check - time.time()
+                while remaining_time > 0 and not self._stop.is_set():
+                    self._stop.wait(min(remaining_time, _STOP_CHECK_INTERVAL))
+                    remaining_time = next_check - time.time()
+        finally:
+            self.close()
         
         print("\n" + "="*70)
         print("МОНИТОРИНГ ЗАВЕРШЕН")